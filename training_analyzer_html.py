@@ -4,89 +4,296 @@
 Analyzes Garmin Connect data and generates interactive HTML reports
 """
 
+import csv
+import hashlib
+import json
+import re
+import jinja2
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import sys
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pac
+    import pyarrow.parquet as pq
+except ImportError:  # fall back to pandas' C parser and skip the Parquet cache
+    pa = None
+from datetime import timedelta
 import os
-import webbrowser
+
+# Report layout and stylesheet live next to this script; both are loaded once at import
+_TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+# StrictUndefined: a misspelled or missing context key fails the render instead of printing ''
+_JINJA_ENV = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(_TEMPLATE_DIR),
+    undefined=jinja2.StrictUndefined,
+)
+_TEMPLATE = _JINJA_ENV.get_template('report_template.html')
+
+def _load_css():
+    """report.css with comments and insignificant whitespace stripped"""
+    with open(os.path.join(_TEMPLATE_DIR, 'report.css'), encoding='utf-8') as f:
+        css = re.sub(r'/\*.*?\*/', '', f.read(), flags=re.S)
+    return re.sub(r'\s*([{}:;,])\s*', r'\1', re.sub(r'\s+', ' ', css)).strip()
+
+# Minified stylesheet inlined into every report
+_CSS_MIN = _load_css()
+
+# Fingerprint of this script; any edit to the parsing or cleaning code invalidates the Parquet cache
+_SCRIPT_VERSION = str(os.path.getmtime(os.path.abspath(__file__)))
+
+# Fingerprint of what shapes a report besides its inputs (template, stylesheet, this script),
+# part of the report cache key so edits to any of them force a re-render
+_REPORT_VERSION = hashlib.sha1(
+    f"{_JINJA_ENV.loader.get_source(_JINJA_ENV, 'report_template.html')[0]}:{_CSS_MIN}:"
+    f"{_SCRIPT_VERSION}".encode()
+).hexdigest()
+
+# Columns the analysis references; everything else in the export is skipped at parse time
+_NEEDED = ['Date', 'Activity Type', 'Distance', 'Calories', 'Time',
+           'Total Ascent', 'Total Descent', 'Avg HR', 'Max HR', 'Aerobic TE']
+
+# Explicit types for the columns the analysis uses (Arrow type aliases,
+# which double as pandas dtype names apart from the Date timestamp)
+_COLUMN_TYPES = {
+    'Date': 'timestamp[s]',
+    'Time': 'string',
+    'Avg HR': 'float32',
+    'Max HR': 'float32',
+    'Aerobic TE': 'float32',
+}
+
+# Numeric columns Garmin writes with thousands separators ("1,366");
+# Arrow reads them as strings and casts after the commas are stripped
+_THOUSANDS_COLUMNS = {
+    'Distance': 'float64',
+    'Calories': 'float64',
+    'Total Ascent': 'float32',
+    'Total Descent': 'float32',
+}
+
+# Columns where a missing value means zero (no elevation recorded)
+_ZERO_FILL_COLUMNS = ('Total Ascent', 'Total Descent')
+
+# Parquet metadata key holding the _SCRIPT_VERSION that wrote the cache
+_CACHE_VERSION_KEY = b'training_analyzer_version'
+
+# Columns the analysis can't run without; fallback check for a cache missing any of them
+_CACHE_REQUIRED = ('Date', 'Activity Type', 'Distance', 'Total Ascent', 'Time_Minutes')
+
+# Weekly (distance km, elevation m, runs) targets, indexed by plan week - 1
+_PLAN_TARGETS = (
+    (35, 200, 4),
+    (38, 250, 4),
+    (42, 280, 4),
+    (45, 300, 4),
+    (45, 400, 4),
+    (48, 450, 4),
+    (52, 550, 4),
+    (55, 600, 4),
+    (52, 650, 4),
+    (56, 700, 4),
+    (60, 850, 5),
+    (60, 900, 5),
+    (55, 750, 4),
+    (48, 600, 4),
+)
+
+# Target for weeks outside the table above
+_DEFAULT_TARGET = (40, 300, 4)
+
+def _plan_target(week):
+    """(distance, elevation, runs) target for a plan week"""
+    return _PLAN_TARGETS[week - 1] if 1 <= week <= len(_PLAN_TARGETS) else _DEFAULT_TARGET
+
+def _last_mean(values, count=10):
+    """Mean of the last `count` values ignoring NaN; NaN (without a RuntimeWarning) if all are missing"""
+    tail = values[-count:]
+    return float('nan') if np.isnan(tail).all() else float(np.nanmean(tail))
+
+def _arrow_types_mapper(arrow_type):
+    """Arrow-backed pandas dtypes, except timestamps which stay datetime64 for the .dt/period API"""
+    if pa.types.is_timestamp(arrow_type):
+        return None
+    return pd.ArrowDtype(arrow_type)
 
 class HTMLTrainingAnalyzer:
     def __init__(self, csv_file):
         """Initialize with Garmin CSV export"""
-        self.df = pd.read_csv(csv_file)
-        self.df['Date'] = pd.to_datetime(self.df['Date'])
-        self.df = self.df.sort_values('Date')
+        self.csv_file = csv_file
+        self.report_reused = False  # set by generate_html_report when an up-to-date report was kept
         
         # Marathon date for reference
         self.marathon_date = pd.to_datetime('2025-10-12')
         self.race_date = pd.to_datetime('2026-04-26')  # Österlen Spring Trail
         
-        # Clean numeric columns
-        self._clean_data()
+        # Parsed, cleaned and sorted data is cached as Parquet next to the CSV
+        cache_file = csv_file + '.parquet' if pa is not None else None
+        self.df = None
+        if cache_file and os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(csv_file):
+            self.df = self._read_cache(cache_file)
         
+        if self.df is None:
+            self.df = self._read_csv(csv_file)
+            self.df = self.df.sort_values('Date')
+            
+            # Clean numeric columns
+            self._clean_data()
+            
+            if cache_file:
+                self._write_cache(cache_file)
+        
+        # Running subset, filtered once and shared read-only by every report
+        self._running = self.df.loc[self.df['Activity Type'] == 'Running'].reset_index(drop=True)
+        
+        # Date-sorted NumPy views for the window filters (searchsorted + slice)
+        self._running_dates = self._running['Date'].values.astype('datetime64[ns]')
+        self._running_dist = self._running['Distance'].to_numpy(dtype=np.float64, na_value=0.0)
+        self._running_elev = self._running['Total Ascent'].to_numpy(dtype=np.float64, na_value=0.0)
+        self._running_time = self._running['Time_Minutes'].to_numpy(dtype=np.float64)
+        
+        # Heart-rate / training-effect arrays; None when the export lacks the column
+        # (an empty array means the column exists but there are no runs)
+        self._running_avghr, self._running_maxhr, self._running_te = (
+            self._running[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            if col in self._running.columns else None
+            for col in ('Avg HR', 'Max HR', 'Aerobic TE')
+        )
+        
+        # Prefix sums: any window total is cum[j] - cum[i]
+        self._cum_dist = np.concatenate(([0.0], np.cumsum(self._running_dist)))
+        self._cum_elev = np.concatenate(([0.0], np.cumsum(self._running_elev)))
+        
+    def _read_cache(self, cache_file):
+        """Cleaned frame from the Parquet cache, or None if it is unreadable or stale"""
+        try:
+            metadata = pq.read_schema(cache_file).metadata or {}
+            if metadata.get(_CACHE_VERSION_KEY) != _SCRIPT_VERSION.encode():
+                return None  # written by another version of this script
+            df = pd.read_parquet(cache_file)
+        except (OSError, pa.ArrowException):
+            return None  # damaged cache; parse the CSV again
+        if not all(col in df.columns for col in _CACHE_REQUIRED):
+            return None  # stale layout; parse the CSV again
+        return df
+    
+    def _write_cache(self, cache_file):
+        """Write the cleaned frame to the Parquet cache via a temp file, so readers never see a partial file"""
+        table = pa.Table.from_pandas(self.df)
+        table = table.replace_schema_metadata(
+            {**table.schema.metadata, _CACHE_VERSION_KEY: _SCRIPT_VERSION.encode()}
+        )
+        tmp_file = cache_file + '.tmp'
+        try:
+            pq.write_table(table, tmp_file, compression='zstd')
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            # read-only location or interrupted write; just parse again next time
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    
+    def _read_csv(self, csv_file):
+        """Parse the Garmin CSV with Arrow's multithreaded reader, or pandas without pyarrow"""
+        # Older exports lack some columns (e.g. Aerobic TE), so only ask for those present
+        with open(csv_file, newline='', encoding='utf-8-sig') as f:
+            header = next(csv.reader(f), [])
+        columns = [col for col in _NEEDED if col in header]
+        
+        if pa is None:
+            dtypes = {**_COLUMN_TYPES, **_THOUSANDS_COLUMNS}
+            del dtypes['Date']
+            df = pd.read_csv(csv_file, usecols=columns, dtype=dtypes, thousands=',',
+                             na_values=['--'], parse_dates=['Date'])
+            for col in _ZERO_FILL_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].fillna(0)
+            return df
+        
+        read_options = pac.ReadOptions(block_size=8 << 20)
+        convert_options = pac.ConvertOptions(
+            include_columns=columns,
+            column_types={
+                **{col: pa.type_for_alias(dtype) for col, dtype in _COLUMN_TYPES.items()},
+                **{col: pa.string() for col in _THOUSANDS_COLUMNS},
+            },
+            null_values=['--', ''],
+            strings_can_be_null=True,
+            timestamp_parsers=['%Y-%m-%d %H:%M:%S', '%Y-%m-%d'],
+            decimal_point='.',
+        )
+        table = pac.read_csv(csv_file, read_options=read_options, convert_options=convert_options)
+        
+        # Strip thousands separators, cast and zero-fill, still inside Arrow
+        for col, dtype in _THOUSANDS_COLUMNS.items():
+            if col in table.column_names:
+                i = table.column_names.index(col)
+                values = pc.cast(pc.replace_substring(table.column(i), ',', ''), pa.type_for_alias(dtype))
+                if col in _ZERO_FILL_COLUMNS:
+                    values = pc.fill_null(values, 0)
+                table = table.set_column(i, col, values)
+        
+        return table.to_pandas(types_mapper=_arrow_types_mapper)
+    
     def _clean_data(self):
         """Clean and convert data types"""
-        # Remove commas from numbers
-        self.df['Distance'] = self.df['Distance'].astype(str).str.replace(',', '').astype(float)
-        self.df['Calories'] = self.df['Calories'].astype(str).str.replace(',', '').astype(float)
-        
-        # Convert time to minutes
-        def time_to_minutes(time_str):
-            try:
-                if pd.isna(time_str):
-                    return 0
-                parts = str(time_str).split(':')
-                if len(parts) == 3:
-                    h, m, s = parts
-                    return int(h) * 60 + int(m) + float(s) / 60
-                elif len(parts) == 2:
-                    m, s = parts
-                    return int(m) + float(s) / 60
-                return 0
-            except:
-                return 0
-        
-        self.df['Time_Minutes'] = self.df['Time'].apply(time_to_minutes)
-        
-        # Fill NaN elevations with 0
-        self.df['Total Ascent'] = pd.to_numeric(self.df['Total Ascent'], errors='coerce').fillna(0)
-        self.df['Total Descent'] = pd.to_numeric(self.df['Total Descent'], errors='coerce').fillna(0)
+        # Few distinct activity types: categorical codes make the Running filter an int compare
+        self.df['Activity Type'] = self.df['Activity Type'].astype('category')
+        
+        # Convert time to minutes in one vectorized pass; to_timedelta reads
+        # "MM:SS" as "HH:MM", so pad those to "00:MM:SS" first
+        time = self.df['Time'].astype(str)
+        time = time.mask(time.str.count(':').eq(1), '00:' + time)
+        td = pd.to_timedelta(time, errors='coerce')
+        self.df['Time_Minutes'] = td.dt.total_seconds().div(60).fillna(0)
         
     def get_running_data(self):
-        """Filter for running activities only"""
-        return self.df[self.df['Activity Type'] == 'Running'].copy()
+        """Running activities only (cached; treat as read-only)"""
+        return self._running
     
     def _get_weekly_data(self, weeks=4):
-        """Get weekly aggregated data for charts"""
-        running = self.get_running_data()
-        cutoff_date = running['Date'].max() - timedelta(days=weeks*7)
-        recent = running[running['Date'] >= cutoff_date].copy()
-        
-        recent['Week'] = recent['Date'].dt.to_period('W')
-        weekly = recent.groupby('Week').agg({
-            'Distance': 'sum',
-            'Total Ascent': 'sum',
-            'Time_Minutes': 'sum',
-            'Activity Type': 'count',
-            'Avg HR': 'mean',
-            'Aerobic TE': 'sum'
-        }).round(1)
+        """Get weekly aggregated data for charts, as per-week NumPy arrays"""
+        dates = self._running_dates
+        i = np.searchsorted(dates, dates[-1] - np.timedelta64(weeks * 7, 'D')) if len(dates) else 0
+        
+        # Monday-based week index (1970-01-01 was a Thursday), rebased to the first week;
+        # no runs in the window gives zero bins, so every series below comes out empty
+        week = (dates[i:].astype('datetime64[D]').view('i8') + 3) // 7
+        first_week = week[0] if week.size else 0
+        week = week - first_week
+        n_weeks = week[-1] + 1 if week.size else 0
+        
+        def weekly_sum(values):
+            return np.bincount(week, weights=values[i:], minlength=n_weeks).round(1)
+        
+        # Label each bin Monday/Sunday, one entry per calendar week including empty ones
+        starts = ((first_week + np.arange(n_weeks)) * 7 - 3).astype('datetime64[D]')
+        weekly = {
+            'Week': [f"{start}/{start + 6}" for start in starts],
+            'Distance': weekly_sum(self._running_dist),
+            'Total Ascent': weekly_sum(self._running_elev),
+            'Time_Minutes': weekly_sum(self._running_time),
+            'Runs': np.bincount(week, minlength=n_weeks),
+        }
+        if self._running_avghr is not None:
+            hr = self._running_avghr[i:]
+            has_hr = ~np.isnan(hr)
+            hr_sum = np.bincount(week[has_hr], weights=hr[has_hr], minlength=n_weeks)
+            hr_count = np.bincount(week[has_hr], minlength=n_weeks)
+            weekly['Avg HR'] = np.divide(hr_sum, hr_count, out=np.full(n_weeks, np.nan),
+                                         where=hr_count > 0).round(1)
+        if self._running_te is not None:
+            weekly['Aerobic TE'] = weekly_sum(np.nan_to_num(self._running_te))
         
         return weekly
     
     def _get_chart_data(self):
-        """Prepare data for JavaScript charts"""
+        """Prepare data for JavaScript charts, already serialized as JSON literals"""
         weekly = self._get_weekly_data(weeks=8)
         
-        weeks = [str(w) for w in weekly.index]
-        distances = weekly['Distance'].tolist()
-        elevations = weekly['Total Ascent'].tolist()
-        
         return {
-            'weeks': weeks,
-            'distances': distances,
-            'elevations': elevations
+            'weeks': json.dumps(weekly['Week'], separators=(',', ':')),
+            'distances': json.dumps(weekly['Distance'].tolist(), separators=(',', ':')),
+            'elevations': json.dumps(weekly['Total Ascent'].tolist(), separators=(',', ':'))
         }
     
     def _get_fika_of_week(self, week_num):
@@ -96,7 +303,7 @@ class HTMLTrainingAnalyzer:
                 'name': 'Swedish Cardamom Buns (Kardemummabullar)',
                 'url': 'https://www.bbc.co.uk/food/recipes/swedish_cardamom_buns_12727',
                 'source': 'BBC Good Food',
-                'fact': 'Cardamom is Sweden's favorite spice! Swedes use more cardamom per capita than any other country. It's in everything from kanelbullar to Christmas cookies.',
+                'fact': "Cardamom is Sweden's favorite spice! Swedes use more cardamom per capita than any other country. It's in everything from kanelbullar to Christmas cookies.",
                 'why': 'These buns use wholemeal flour for extra fiber and are naturally sweetened. The cardamom also aids digestion - perfect post-run treat!'
             },
             2: {
@@ -104,20 +311,20 @@ class HTMLTrainingAnalyzer:
                 'url': 'https://www.bbc.co.uk/food/recipes/swedish_cinnamon_buns_12726',
                 'source': 'BBC Good Food',
                 'fact': 'October 4th is "Kanelbullens Dag" (Cinnamon Bun Day) in Sweden! Swedes consume an average of 316 cinnamon buns per person per year.',
-                'why': 'A Swedish classic! Made with milk and eggs for protein. Enjoy one after your long run - you've earned it!'
+                'why': "A Swedish classic! Made with milk and eggs for protein. Enjoy one after your long run - you've earned it!"
             },
             3: {
                 'name': 'Oat & Raisin Cookies',
                 'url': 'https://www.bbcgoodfood.com/recipes/oat-raisin-cookies',
                 'source': 'BBC Good Food',
-                'fact': 'Oats are a runner's best friend - they provide slow-release energy and contain beta-glucans which help reduce cholesterol.',
+                'fact': "Oats are a runner's best friend - they provide slow-release energy and contain beta-glucans which help reduce cholesterol.",
                 'why': 'Packed with oats for sustained energy, raisins for natural sweetness and iron. Great pre-run snack too!'
             },
             4: {
                 'name': 'Banana Bread',
                 'url': 'https://www.bbcgoodfood.com/recipes/brilliant-banana-loaf',
                 'source': 'BBC Good Food',
-                'fact': 'Bananas are nature's energy bar! They're packed with potassium which helps prevent muscle cramps - essential for runners.',
+                'fact': "Bananas are nature's energy bar! They're packed with potassium which helps prevent muscle cramps - essential for runners.",
                 'why': 'Natural sweetness from bananas means less added sugar. High in potassium for muscle recovery. Freezes well for weekly meal prep!'
             },
             5: {
@@ -131,7 +338,7 @@ class HTMLTrainingAnalyzer:
                 'name': 'Swedish Apple Cake (Äppelkaka)',
                 'url': 'https://www.bbcgoodfood.com/recipes/swedish-apple-cake',
                 'source': 'BBC Good Food',
-                'fact': 'Apples float in water because they're 25% air! They're also packed with quercetin, an antioxidant that may improve endurance.',
+                'fact': "Apples float in water because they're 25% air! They're also packed with quercetin, an antioxidant that may improve endurance.",
                 'why': 'Light and fruity! Apples add natural sweetness and fiber. Much lower in sugar than traditional cakes.'
             },
             7: {
@@ -159,7 +366,7 @@ class HTMLTrainingAnalyzer:
                 'name': 'Blueberry Muffins',
                 'url': 'https://www.bbcgoodfood.com/recipes/blueberry-muffins',
                 'source': 'BBC Good Food',
-                'fact': 'Blueberries are called "superfood" for runners - they're packed with antioxidants that speed up muscle recovery!',
+                'fact': 'Blueberries are called "superfood" for runners - they\'re packed with antioxidants that speed up muscle recovery!',
                 'why': 'Blueberries are high in antioxidants for recovery. Make a batch and freeze for quick breakfast options.'
             },
         }
@@ -170,17 +377,41 @@ class HTMLTrainingAnalyzer:
     
     def generate_html_report(self, current_week_of_plan=1, output_file='training_report.html'):
         """Generate complete HTML report"""
-        running = self.get_running_data()
+        now = pd.Timestamp.now()  # one clock read shared by countdown and footer
+        
+        # Same export, plan week, day and report version render the same report;
+        # reuse it if already on disk
+        csv_path = os.path.abspath(self.csv_file)
+        cache_key = hashlib.sha1(
+            f"{csv_path}:{os.path.getmtime(csv_path)}:{current_week_of_plan}:{now.date()}:"
+            f"{_REPORT_VERSION}".encode()
+        ).hexdigest()
+        self.report_reused = False
+        if os.path.exists(output_file):
+            with open(output_file, 'rb') as f:
+                head = f.read(200)
+                f.seek(max(os.path.getsize(output_file) - 64, 0))
+                tail = f.read()
+            # Only trust a complete document; a truncated file can carry the key too
+            if f"<!-- cachekey:{cache_key} -->".encode() in head and tail.rstrip().endswith(b'</html>'):
+                self.report_reused = True
+                return output_file
+        
+        dates = self._running_dates
+        cum_dist, cum_elev = self._cum_dist, self._cum_elev
+        n = len(dates)
+        # The latest run anchors every window; with no runs, anchor on today so all windows are empty
+        last_date = pd.Timestamp(dates[-1]) if n else now.normalize()
         
         # Get all analysis data
-        days_since_marathon = (running['Date'].max() - self.marathon_date).days
+        days_since_marathon = (last_date - self.marathon_date).days
         weeks_since = days_since_marathon / 7
         
         # Post-marathon stats
-        post_marathon = running[running['Date'] > self.marathon_date]
-        post_marathon_runs = len(post_marathon)
-        post_marathon_distance = post_marathon['Distance'].sum()
-        post_marathon_avg = post_marathon['Distance'].mean() if len(post_marathon) > 0 else 0
+        i = np.searchsorted(dates, self.marathon_date.to_datetime64(), side='right')
+        post_marathon_runs = n - i
+        post_marathon_distance = cum_dist[n] - cum_dist[i]
+        post_marathon_avg = post_marathon_distance / post_marathon_runs if post_marathon_runs > 0 else 0
         
         # Recovery status
         if weeks_since < 2:
@@ -194,47 +425,26 @@ class HTMLTrainingAnalyzer:
             recovery_class = "success"
         
         # Recent 4 weeks analysis
-        recent_4wks = running[running['Date'] >= running['Date'].max() - timedelta(days=28)]
-        total_distance = recent_4wks['Distance'].sum()
-        total_elevation = recent_4wks['Total Ascent'].sum()
-        total_runs = len(recent_4wks)
+        i = np.searchsorted(dates, (last_date - timedelta(days=28)).to_datetime64())
+        total_distance = cum_dist[n] - cum_dist[i]
+        total_elevation = cum_elev[n] - cum_elev[i]
+        total_runs = n - i
         avg_distance = total_distance / total_runs if total_runs > 0 else 0
         avg_weekly_dist = total_distance / 4
         avg_weekly_elev = total_elevation / 4
         
-        # Last 7 days
-        last_week_end = running['Date'].max()
-        last_week_start = last_week_end - timedelta(days=7)
-        last_week = running[(running['Date'] >= last_week_start) & 
-                           (running['Date'] <= last_week_end)]
-        
-        week_distance = last_week['Distance'].sum()
-        week_elevation = last_week['Total Ascent'].sum()
-        week_runs = len(last_week)
+        # Last 7 days (dates are sorted, so the window runs to the end)
+        i = np.searchsorted(dates, (last_date - timedelta(days=7)).to_datetime64())
+        week_distance = cum_dist[n] - cum_dist[i]
+        week_elevation = cum_elev[n] - cum_elev[i]
+        week_runs = n - i
         
         # Training plan targets
-        plan_targets = {
-            1: {'distance': 35, 'elevation': 200, 'runs': 4},
-            2: {'distance': 38, 'elevation': 250, 'runs': 4},
-            3: {'distance': 42, 'elevation': 280, 'runs': 4},
-            4: {'distance': 45, 'elevation': 300, 'runs': 4},
-            5: {'distance': 45, 'elevation': 400, 'runs': 4},
-            6: {'distance': 48, 'elevation': 450, 'runs': 4},
-            7: {'distance': 52, 'elevation': 550, 'runs': 4},
-            8: {'distance': 55, 'elevation': 600, 'runs': 4},
-            9: {'distance': 52, 'elevation': 650, 'runs': 4},
-            10: {'distance': 56, 'elevation': 700, 'runs': 4},
-            11: {'distance': 60, 'elevation': 850, 'runs': 5},
-            12: {'distance': 60, 'elevation': 900, 'runs': 5},
-            13: {'distance': 55, 'elevation': 750, 'runs': 4},
-            14: {'distance': 48, 'elevation': 600, 'runs': 4},
-        }
-        
-        target = plan_targets.get(current_week_of_plan, {'distance': 40, 'elevation': 300, 'runs': 4})
+        target_distance, target_elevation, target_runs = _plan_target(current_week_of_plan)
         
-        dist_pct = (week_distance / target['distance']) * 100 if target['distance'] > 0 else 0
-        elev_pct = (week_elevation / target['elevation']) * 100 if target['elevation'] > 0 else 0
-        runs_pct = (week_runs / target['runs']) * 100 if target['runs'] > 0 else 0
+        dist_pct = (week_distance / target_distance) * 100 if target_distance > 0 else 0
+        elev_pct = (week_elevation / target_elevation) * 100 if target_elevation > 0 else 0
+        runs_pct = (week_runs / target_runs) * 100 if target_runs > 0 else 0
         
         # Assessment
         if dist_pct >= 90 and elev_pct >= 80:
@@ -250,13 +460,12 @@ class HTMLTrainingAnalyzer:
             assessment_class = "danger"
             assessment_icon = "⚠"
         
-        # HR analysis
-        recent_10 = running.tail(10)
-        avg_hr = recent_10['Avg HR'].mean() if 'Avg HR' in recent_10.columns else 0
-        max_hr = recent_10['Max HR'].mean() if 'Max HR' in recent_10.columns else 0
+        # HR analysis over the last 10 runs
+        avg_hr = _last_mean(self._running_avghr) if self._running_avghr is not None and self._running_avghr.size else 0
+        max_hr = _last_mean(self._running_maxhr) if self._running_maxhr is not None and self._running_maxhr.size else 0
         
-        if 'Aerobic TE' in recent_10.columns:
-            avg_te = recent_10['Aerobic TE'].mean()
+        if self._running_te is not None and self._running_te.size:
+            avg_te = _last_mean(self._running_te)
             if avg_te > 4.0:
                 load_status = "HIGH LOAD"
                 load_class = "danger"
@@ -272,7 +481,7 @@ class HTMLTrainingAnalyzer:
             load_class = "secondary"
         
         # Race countdown
-        days_to_race = (self.race_date - datetime.now()).days
+        days_to_race = (self.race_date - now).days
         weeks_to_race = days_to_race / 7
         
         # Phase info
@@ -298,634 +507,71 @@ class HTMLTrainingAnalyzer:
         fika = self._get_fika_of_week(current_week_of_plan)
         chart_data = self._get_chart_data()
         
-        # Generate HTML
-        html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Training Report - Week {current_week_of_plan}</title>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 20px;
-        }}
-        
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 20px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-            overflow: hidden;
-        }}
-        
-        .header {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 40px;
-            text-align: center;
-        }}
-        
-        .header h1 {{
-            font-size: 2.5em;
-            margin-bottom: 10px;
-            font-weight: 700;
-        }}
-        
-        .header p {{
-            font-size: 1.2em;
-            opacity: 0.9;
-        }}
-        
-        .content {{
-            padding: 40px;
-        }}
-        
-        .stats-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 20px;
-            margin-bottom: 40px;
-        }}
-        
-        .stat-card {{
-            background: #f8f9fa;
-            border-radius: 12px;
-            padding: 25px;
-            border-left: 4px solid #667eea;
-            transition: transform 0.2s, box-shadow 0.2s;
-        }}
-        
-        .stat-card:hover {{
-            transform: translateY(-5px);
-            box-shadow: 0 10px 25px rgba(0,0,0,0.1);
-        }}
-        
-        .stat-label {{
-            font-size: 0.9em;
-            color: #666;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-            margin-bottom: 10px;
-        }}
-        
-        .stat-value {{
-            font-size: 2.5em;
-            font-weight: bold;
-            color: #667eea;
-            line-height: 1;
-        }}
-        
-        .stat-unit {{
-            font-size: 0.5em;
-            color: #999;
-            font-weight: normal;
-        }}
-        
-        .section {{
-            margin-bottom: 40px;
-        }}
-        
-        .section-title {{
-            font-size: 1.8em;
-            margin-bottom: 20px;
-            color: #2c3e50;
-            border-bottom: 3px solid #667eea;
-            padding-bottom: 10px;
-        }}
-        
-        .badge {{
-            display: inline-block;
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-size: 0.85em;
-            font-weight: 600;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-        }}
-        
-        .badge.success {{
-            background: #d4edda;
-            color: #155724;
-        }}
-        
-        .badge.warning {{
-            background: #fff3cd;
-            color: #856404;
-        }}
-        
-        .badge.danger {{
-            background: #f8d7da;
-            color: #721c24;
-        }}
-        
-        .badge.secondary {{
-            background: #e2e3e5;
-            color: #383d41;
-        }}
-        
-        .progress-container {{
-            background: #e9ecef;
-            border-radius: 10px;
-            overflow: hidden;
-            margin: 10px 0;
-            height: 30px;
-            position: relative;
-        }}
-        
-        .progress-bar {{
-            height: 100%;
-            background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-            font-weight: 600;
-            transition: width 1s ease;
-        }}
-        
-        .comparison-table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin: 20px 0;
-            background: white;
-            border-radius: 8px;
-            overflow: hidden;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-        }}
-        
-        .comparison-table th,
-        .comparison-table td {{
-            padding: 15px;
-            text-align: left;
-        }}
-        
-        .comparison-table th {{
-            background: #667eea;
-            color: white;
-            font-weight: 600;
-            text-transform: uppercase;
-            font-size: 0.9em;
-            letter-spacing: 0.5px;
-        }}
-        
-        .comparison-table tr:nth-child(even) {{
-            background: #f8f9fa;
-        }}
-        
-        .comparison-table tr:hover {{
-            background: #e9ecef;
-        }}
-        
-        .chart-container {{
-            position: relative;
-            height: 300px;
-            margin: 30px 0;
-            background: white;
-            padding: 20px;
-            border-radius: 12px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-        }}
-        
-        .alert {{
-            padding: 20px;
-            border-radius: 8px;
-            margin: 20px 0;
-            border-left: 4px solid;
-        }}
-        
-        .alert.success {{
-            background: #d4edda;
-            border-color: #28a745;
-            color: #155724;
-        }}
-        
-        .alert.warning {{
-            background: #fff3cd;
-            border-color: #ffc107;
-            color: #856404;
-        }}
-        
-        .alert.info {{
-            background: #d1ecf1;
-            border-color: #17a2b8;
-            color: #0c5460;
-        }}
-        
-        .recommendations {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 30px;
-            border-radius: 12px;
-            margin: 30px 0;
-        }}
-        
-        .recommendations h3 {{
-            margin-bottom: 15px;
-            font-size: 1.5em;
-        }}
-        
-        .recommendations ul {{
-            list-style: none;
-            padding: 0;
-        }}
-        
-        .recommendations li {{
-            padding: 10px 0;
-            padding-left: 30px;
-            position: relative;
-        }}
-        
-        .recommendations li:before {{
-            content: "→";
-            position: absolute;
-            left: 0;
-            font-weight: bold;
-            font-size: 1.2em;
-        }}
-        
-        .footer {{
-            text-align: center;
-            padding: 30px;
-            background: #f8f9fa;
-            color: #666;
-            font-size: 0.9em;
-        }}
-        
-        @media print {{
-            body {{
-                background: white;
-                padding: 0;
-            }}
-            .container {{
-                box-shadow: none;
-            }}
-            .stat-card:hover {{
-                transform: none;
-            }}
-        }}
-        
-        
-        .fika-section {
-            background: linear-gradient(135deg, #f5f5dc 0%, #fff8dc 100%);
-            border-radius: 16px;
-            padding: 30px;
-            margin: 30px 0;
-            border: 3px solid #d4a574;
-        }
-        
-        .fika-card {
-            background: white;
-            padding: 25px;
-            border-radius: 12px;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-        }
-        
-        .fika-name {
-            color: #8b4513;
-            font-size: 1.8em;
-            margin-bottom: 15px;
-            font-weight: bold;
-        }
-        
-        .fika-source {
-            font-size: 1.1em;
-            margin: 10px 0;
-        }
-        
-        .fika-source a {
-            color: #667eea;
-            text-decoration: none;
-            font-weight: 600;
-        }
-        
-        .fika-source a:hover {
-            text-decoration: underline;
-        }
-        
-        .fika-fact {
-            background: #fff8e1;
-            padding: 15px;
-            border-left: 4px solid #ffd700;
-            margin: 15px 0;
-            border-radius: 4px;
-        }
-        
-        .fika-why {
-            background: #e8f5e9;
-            padding: 15px;
-            border-left: 4px solid #4caf50;
-            margin: 15px 0;
-            border-radius: 4px;
-        }
-        
-        .fika-tagline {
-            text-align: center;
-            font-size: 1.1em;
-            color: #8b4513;
-            margin-top: 20px;
-            font-style: italic;
-        }
-        
-        @media (max-width: 768px) {{
-            .stats-grid {{
-                grid-template-columns: 1fr;
-            }}
-            .header h1 {{
-                font-size: 1.8em;
-            }}
-            .content {{
-                padding: 20px;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🏃‍♂️ Training Analysis Report</h1>
-            <p>Österlen Spring Trail 60km Preparation</p>
-            <p style="margin-top: 10px; font-size: 1em;">Week {current_week_of_plan} of 22 • {phase}</p>
-        </div>
-        
-        <div class="content">
-            <!-- Race Countdown -->
-            <div class="alert info">
-                <strong>🎯 Race Countdown:</strong> {days_to_race} days ({weeks_to_race:.0f} weeks) until Österlen Spring Trail 60km
-            </div>
-            
-            <!-- Key Stats -->
-            <div class="section">
-                <h2 class="section-title">📊 Key Statistics</h2>
-                <div class="stats-grid">
-                    <div class="stat-card">
-                        <div class="stat-label">Weekly Distance</div>
-                        <div class="stat-value">{avg_weekly_dist:.1f} <span class="stat-unit">km</span></div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-label">Weekly Elevation</div>
-                        <div class="stat-value">{avg_weekly_elev:.0f} <span class="stat-unit">m</span></div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-label">Total Runs (4 weeks)</div>
-                        <div class="stat-value">{total_runs}</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-label">Average HR</div>
-                        <div class="stat-value">{avg_hr:.0f} <span class="stat-unit">bpm</span></div>
-                    </div>
-                </div>
-            </div>
-            
-            <!-- Marathon Recovery -->
-            <div class="section">
-                <h2 class="section-title">🏃 Marathon Recovery Status</h2>
-                <p><strong>Marathon Date:</strong> {self.marathon_date.date()}</p>
-                <p><strong>Days Since Marathon:</strong> {days_since_marathon} days ({weeks_since:.1f} weeks)</p>
-                <p><strong>Marathon Time:</strong> 4:10:00</p>
-                <p style="margin-top: 15px;"><strong>Status:</strong> <span class="badge {recovery_class}">{recovery_status}</span></p>
-                <p style="margin-top: 10px;"><strong>Post-Marathon Running:</strong> {post_marathon_runs} runs, {post_marathon_distance:.1f} km total (avg {post_marathon_avg:.1f} km/run)</p>
-            </div>
-            
-            <!-- Week Progress -->
-            <div class="section">
-                <h2 class="section-title">🎯 Week {current_week_of_plan} Progress vs Plan</h2>
-                
-                <table class="comparison-table">
-                    <thead>
-                        <tr>
-                            <th>Metric</th>
-                            <th>Actual</th>
-                            <th>Target</th>
-                            <th>Progress</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        <tr>
-                            <td><strong>Distance (km)</strong></td>
-                            <td>{week_distance:.1f} km</td>
-                            <td>{target['distance']} km</td>
-                            <td>
-                                <div class="progress-container">
-                                    <div class="progress-bar" style="width: {min(dist_pct, 100):.0f}%">{dist_pct:.0f}%</div>
-                                </div>
-                            </td>
-                        </tr>
-                        <tr>
-                            <td><strong>Elevation (m)</strong></td>
-                            <td>{week_elevation:.0f} m</td>
-                            <td>{target['elevation']} m</td>
-                            <td>
-                                <div class="progress-container">
-                                    <div class="progress-bar" style="width: {min(elev_pct, 100):.0f}%">{elev_pct:.0f}%</div>
-                                </div>
-                            </td>
-                        </tr>
-                        <tr>
-                            <td><strong>Number of Runs</strong></td>
-                            <td>{week_runs}</td>
-                            <td>{target['runs']}</td>
-                            <td>
-                                <div class="progress-container">
-                                    <div class="progress-bar" style="width: {min(runs_pct, 100):.0f}%">{runs_pct:.0f}%</div>
-                                </div>
-                            </td>
-                        </tr>
-                    </tbody>
-                </table>
-                
-                <div class="alert {assessment_class}" style="margin-top: 20px;">
-                    <strong>{assessment_icon} Assessment:</strong> {assessment}
-                </div>
-            </div>
-            
-            <!-- Charts -->
-            <div class="section">
-                <h2 class="section-title">📈 Training Trends (Last 8 Weeks)</h2>
-                <div class="chart-container">
-                    <canvas id="distanceChart"></canvas>
-                </div>
-                <div class="chart-container">
-                    <canvas id="elevationChart"></canvas>
-                </div>
-            </div>
-            
-            <!-- HR Analysis -->
-            <div class="section">
-                <h2 class="section-title">❤️ Heart Rate & Recovery</h2>
-                <div class="stats-grid">
-                    <div class="stat-card">
-                        <div class="stat-label">Avg HR (last 10 runs)</div>
-                        <div class="stat-value">{avg_hr:.0f} <span class="stat-unit">bpm</span></div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-label">Avg Max HR</div>
-                        <div class="stat-value">{max_hr:.0f} <span class="stat-unit">bpm</span></div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-label">Training Load</div>
-                        <div class="stat-value">{avg_te:.1f}</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-label">Load Status</div>
-                        <div class="stat-value" style="font-size: 1.2em;"><span class="badge {load_class}">{load_status}</span></div>
-                    </div>
-                </div>
-            </div>
-            
-            <!-- Recommendations -->
-            <div class="recommendations">
-                <h3>💡 Recommendations for Next Week</h3>
-                <p style="margin-bottom: 15px;"><strong>Current Phase:</strong> {phase}</p>
-                <p style="margin-bottom: 15px;"><strong>Focus:</strong> {phase_focus}</p>
-                <ul>
-                    <li>Target weekly distance: {plan_targets.get(current_week_of_plan + 1, {}).get('distance', 40)} km</li>
-                    <li>Target elevation gain: {plan_targets.get(current_week_of_plan + 1, {}).get('elevation', 300)} m</li>
-                    <li>Use your 22km work commute for long run</li>
-                    <li>Maintain weekly gym session (squats, lunges, Nordic curls)</li>
-                    <li>Practice race nutrition on runs &gt;90 minutes</li>
-                    <li>Use stair machine 2-3x per week for elevation work</li>
-                </ul>
-            </div>
-        </div>
-        
-        <div class="footer">
-            <p>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            <p>Österlen Spring Trail 60km Training Analysis • Week {current_week_of_plan} of 22</p>
-        </div>
-            
-            <!-- Fika of the Week -->
-            <div class="section fika-section">
-                <h2 class="section-title">☕ FIKA OF THE WEEK 🥐</h2>
-                <div class="fika-card">
-                    <h3 class="fika-name">{fika['name']}</h3>
-                    <p class="fika-source">
-                        <strong>Recipe:</strong> 
-                        <a href="{fika['url']}" target="_blank" rel="noopener">{fika['source']}</a>
-                    </p>
-                    <div class="fika-fact">
-                        <strong>🍪 Fun Fact:</strong> {fika['fact']}
-                    </div>
-                    <div class="fika-why">
-                        <strong>💪 Why This Fika:</strong> {fika['why']}
-                    </div>
-                    <p class="fika-tagline"><em>You've earned this treat - enjoy your fika! ☕</em></p>
-                </div>
-            </div>
-    </div>
-    
-    <script>
-        // Distance Chart
-        const distanceCtx = document.getElementById('distanceChart').getContext('2d');
-        new Chart(distanceCtx, {{
-            type: 'line',
-            data: {{
-                labels: {chart_data['weeks']},
-                datasets: [{{
-                    label: 'Weekly Distance (km)',
-                    data: {chart_data['distances']},
-                    borderColor: '#667eea',
-                    backgroundColor: 'rgba(102, 126, 234, 0.1)',
-                    borderWidth: 3,
-                    fill: true,
-                    tension: 0.4,
-                    pointRadius: 5,
-                    pointHoverRadius: 7
-                }}]
-            }},
-            options: {{
-                responsive: true,
-                maintainAspectRatio: false,
-                plugins: {{
-                    legend: {{
-                        display: true,
-                        position: 'top'
-                    }},
-                    title: {{
-                        display: true,
-                        text: 'Weekly Distance Trend',
-                        font: {{
-                            size: 16,
-                            weight: 'bold'
-                        }}
-                    }}
-                }},
-                scales: {{
-                    y: {{
-                        beginAtZero: true,
-                        title: {{
-                            display: true,
-                            text: 'Distance (km)'
-                        }}
-                    }}
-                }}
-            }}
-        }});
-        
-        // Elevation Chart
-        const elevationCtx = document.getElementById('elevationChart').getContext('2d');
-        new Chart(elevationCtx, {{
-            type: 'bar',
-            data: {{
-                labels: {chart_data['weeks']},
-                datasets: [{{
-                    label: 'Weekly Elevation (m)',
-                    data: {chart_data['elevations']},
-                    backgroundColor: 'rgba(118, 75, 162, 0.8)',
-                    borderColor: '#764ba2',
-                    borderWidth: 2
-                }}]
-            }},
-            options: {{
-                responsive: true,
-                maintainAspectRatio: false,
-                plugins: {{
-                    legend: {{
-                        display: true,
-                        position: 'top'
-                    }},
-                    title: {{
-                        display: true,
-                        text: 'Weekly Elevation Gain',
-                        font: {{
-                            size: 16,
-                            weight: 'bold'
-                        }}
-                    }}
-                }},
-                scales: {{
-                    y: {{
-                        beginAtZero: true,
-                        title: {{
-                            display: true,
-                            text: 'Elevation (m)'
-                        }}
-                    }}
-                }}
-            }}
-        }});
-    </script>
-</body>
-</html>"""
-        
-        # Write HTML file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+        # Next week's targets for the recommendations
+        next_distance, next_elevation, _ = _plan_target(current_week_of_plan + 1)
+        
+        # Generate HTML as a stream of rendered chunks
+        html = _TEMPLATE.stream(
+            cache_key=cache_key,
+            css=_CSS_MIN,
+            current_week_of_plan=current_week_of_plan,
+            phase=phase,
+            phase_focus=phase_focus,
+            days_to_race=days_to_race,
+            weeks_to_race=weeks_to_race,
+            avg_weekly_dist=avg_weekly_dist,
+            avg_weekly_elev=avg_weekly_elev,
+            total_runs=total_runs,
+            marathon_date=self.marathon_date.date(),
+            days_since_marathon=days_since_marathon,
+            weeks_since=weeks_since,
+            recovery_status=recovery_status,
+            recovery_class=recovery_class,
+            post_marathon_runs=post_marathon_runs,
+            post_marathon_distance=post_marathon_distance,
+            post_marathon_avg=post_marathon_avg,
+            week_distance=week_distance,
+            week_elevation=week_elevation,
+            week_runs=week_runs,
+            target_distance=target_distance,
+            target_elevation=target_elevation,
+            target_runs=target_runs,
+            next_distance=next_distance,
+            next_elevation=next_elevation,
+            dist_pct=dist_pct,
+            elev_pct=elev_pct,
+            runs_pct=runs_pct,
+            assessment=assessment,
+            assessment_class=assessment_class,
+            assessment_icon=assessment_icon,
+            avg_hr=avg_hr,
+            max_hr=max_hr,
+            avg_te=avg_te,
+            load_status=load_status,
+            load_class=load_class,
+            fika=fika,
+            chart_data=chart_data,
+            generated=now.strftime('%Y-%m-%d %H:%M:%S'),
+        )
+        
+        # Write HTML file chunk by chunk, never holding the whole document; render into a
+        # temp file and swap it in only once complete, so a failed render keeps the old report
+        tmp_file = output_file + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                html.dump(f)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+        os.replace(tmp_file, output_file)
         
         return output_file
 
 def main():
+    # CLI-only modules; importing the analyzer as a library doesn't pay for them
+    import sys
+    import webbrowser
+    
     if len(sys.argv) < 2:
         print("Usage: python training_analyzer_html.py <garmin_activities.csv> [week_number] [--output filename.html]")
         print("\nExample: python training_analyzer_html.py Activities.csv 5")
@@ -953,7 +599,10 @@ def main():
     print(f"Generating HTML report for Week {current_week}...")
     output_path = analyzer.generate_html_report(current_week_of_plan=current_week, output_file=output_file)
     
-    print(f"\n✅ Report generated successfully: {output_path}")
+    if analyzer.report_reused:
+        print(f"\n✅ Inputs unchanged, reused existing report: {output_path}")
+    else:
+        print(f"\n✅ Report generated successfully: {output_path}")
     print(f"\nOpening in your default browser...")
     
     # Open in browser